@@ -5,7 +5,7 @@ import os
 
 from corral import core
 
-from . import vvv_flx2mag, catalogs
+from . import catalogs
 
 
 # =============================================================================
@@ -20,8 +20,8 @@ PATH = os.path.abspath(os.path.dirname(__file__))
 # =============================================================================
 
 def build():
-    core.logger.info("Compiling vvv_flx2mag...")
-    vvv_flx2mag.build()
-
+    # vvv_flx2mag is not compiled any more: the pawprints are reduced by
+    # carpyncho.lib.flx2mag. The fortran source is kept only to regenerate
+    # the reference output used in the tests.
     core.logger.info("Extracting Catalogs Dataset...")
     catalogs.build()
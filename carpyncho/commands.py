@@ -17,29 +17,84 @@
 # IMPORTS
 # =============================================================================
 
-import os
+# heavy imports (numpy, sqlalchemy, the models...) are made inside every
+# command so this module doesn't add them to the startup of the cli. Keep in
+# mind that corral itself still imports all the steps (and their
+# dependencies) when it creates the parser, to list the steps groups.
 
-from psutil import virtual_memory
+from __future__ import print_function
 
-from texttable import Texttable
+import os
 
 from corral import cli, conf, db, core
 
-from carpyncho import bin
-from carpyncho.models import (
-    Tile, PawprintStack, PawprintStackXTile, LightCurves)
+from carpyncho.lib import fasttable
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# environment variable with the seed of the random samples
+SEED_ENV_VAR = "CARPYNCHO_SEED"
+
+_random_state = None
 
 
 # =============================================================================
 # HELPER
 # =============================================================================
 
+def get_random_state():
+    """Return the random state shared by all the commands.
+
+    It is created only once, seeded with the CARPYNCHO_SEED environment
+    variable if it is defined.
+
+    """
+    global _random_state
+    if _random_state is None:
+        import numpy as np
+
+        seed = os.environ.get(SEED_ENV_VAR)
+        _random_state = np.random.RandomState(
+            int(seed) if seed else None)
+    return _random_state
+
+
 def log2critcal():
         import logging
         level = logging.CRITICAL
         logging.getLogger('sqlalchemy.engine').setLevel(level)
 
 
+class StatusChoices(object):
+    """Valid statuses of a model, to be used as argparse choices.
+
+    The model is imported only when argparse checks a value or renders the
+    help, so creating the parser doesn't import carpyncho.models.
+
+    """
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._choices = None
+
+    @property
+    def choices(self):
+        if self._choices is None:
+            from carpyncho import models
+            statuses = getattr(models, self.model_name).statuses
+            self._choices = tuple(getattr(statuses, "enums", statuses))
+        return self._choices
+
+    def __contains__(self, value):
+        return value in self.choices
+
+    def __iter__(self):
+        return iter(self.choices)
+
+
 # =============================================================================
 # COMMANDS
 # =============================================================================
@@ -48,120 +103,110 @@ class Paths(cli.BaseCommand):
     """Show the paths of carpyncho"""
 
     def handle(self):
-        table = Texttable(max_width=0)
-        table.set_deco(Texttable.BORDER | Texttable.HEADER | Texttable.VLINES)
-        table.header(("Name", "Path"))
-        table.add_row(("Input Data", conf.settings.INPUT_PATH))
-        table.add_row(("Storage", conf.settings.DATA_PATH))
-        print(table.draw())
+        rows = [
+            ("Input Data", conf.settings.INPUT_PATH),
+            ("Storage", conf.settings.DATA_PATH)]
+        print(fasttable.render(("Name", "Path"), rows))
 
 
 class BuildBin(cli.BaseCommand):
     """Build the bin executables needed to run carpyncho"""
 
     def handle(self):
+        from carpyncho import bin
+
         core.logger.info("Building bin extensions...")
         bin.build()
         core.logger.info("Done")
 
 
-class LSTile(cli.BaseCommand):
-    """List all registered tiles"""
+class ListCommandMixin(object):
+    """Common implementation of the commands that list a table.
+
+    The subclasses must set the ``model_name`` (a name inside
+    carpyncho.models), the ``columns`` of the model to show and the
+    ``header`` of the output table.
+
+    """
 
-    def _bool(self, e):
-        return e.lower() not in ("0", "", "false")
+    model_name = None
+    columns = ()
+    header = ()
 
     def setup(self):
         self.parser.add_argument(
             "-st", "--status", dest="status", action="store",
-            choices=Tile.statuses, nargs="+",
-            help="Show only the given status")
+            choices=StatusChoices(self.model_name), metavar="STATUS",
+            nargs="+", help="Show only the given status (%(choices)s)")
+
+    def build_query(self, session, model, **kwargs):
+        columns = [getattr(model, column) for column in self.columns]
+        return session.query(*columns)
+
+    def handle(self, status, **kwargs):
+        from carpyncho import models
 
-    def handle(self, status):
         log2critcal()
 
-        table = Texttable(max_width=0)
-        table.set_deco(Texttable.BORDER | Texttable.HEADER | Texttable.VLINES)
-        table.header(("Tile", "Status", "VS Tags", "Size", "Ready"))
-        cnt = 0
+        model = getattr(models, self.model_name)
         with db.session_scope() as session:
-            query = session.query(
-                Tile.name, Tile.status,
-                Tile.ogle3_tagged_number, Tile.size,
-                Tile.ready)
+            query = self.build_query(session, model, **kwargs)
             if status:
-                query = query.filter(Tile.status.in_(status))
-            map(table.add_row, query)
-            cnt = query.count()
-        print(table.draw())
-        print("Count: {}".format(cnt))
+                query = query.filter(model.status.in_(status))
+            rows = list(query.yield_per(1000))
+
+        # all the rows are already fetched, no need of another query
+        print(fasttable.render(self.header, rows))
+        print("Count: {}".format(len(rows)))
 
 
-class LSPawprint(cli.BaseCommand):
+class LSTile(ListCommandMixin, cli.BaseCommand):
+    """List all registered tiles"""
+
+    model_name = "Tile"
+    columns = ("name", "status", "ogle3_tagged_number", "size", "ready")
+    header = ("Tile", "Status", "VS Tags", "Size", "Ready")
+
+
+class LSPawprint(ListCommandMixin, cli.BaseCommand):
     """List all registered pawprint stacks"""
 
+    model_name = "PawprintStack"
+    columns = ("name", "status", "band", "mjd", "size")
+    header = ("Pawprint", "Status", "Band", "MJD", "Size")
+
     def setup(self):
-        self.parser.add_argument(
-            "-st", "--status", dest="status", action="store",
-            choices=PawprintStack.statuses.enums, nargs="+",
-            help="Show only the given status")
+        super(LSPawprint, self).setup()
         self.parser.add_argument(
             "-t", "--tile", dest="tiles", action="store", nargs="+",
             help="Show only the given tile/s")
 
-    def handle(self, status, tiles):
-        log2critcal()
+    def build_query(self, session, model, tiles):
+        from carpyncho.models import Tile, PawprintStackXTile
 
-        table = Texttable(max_width=0)
-        table.set_deco(Texttable.BORDER | Texttable.HEADER | Texttable.VLINES)
-        table.header(("Pawprint", "Status", "Band", "MJD", "Size"))
-        cnt = 0
-        with db.session_scope() as session:
-            query = session.query(
-                PawprintStack.name, PawprintStack.status,
-                PawprintStack.band, PawprintStack.mjd, PawprintStack.size)
-            if tiles:
-                ids = [
-                    r[0] for r in
-                    session.query(PawprintStackXTile.pawprint_stack_id).join(Tile).filter(Tile.name.in_(tiles))]
-                query = query.filter(PawprintStack.id.in_(ids))
-
-            if status:
-                query = query.filter(PawprintStack.status.in_(status))
-            map(table.add_row, query)
-            cnt = query.count()
-        print(table.draw())
-        print("Count: {}".format(cnt))
+        query = super(LSPawprint, self).build_query(session, model)
+        if tiles:
+            ids = session.query(
+                PawprintStackXTile.pawprint_stack_id
+            ).join(Tile).filter(Tile.name.in_(tiles))
+            query = query.filter(model.id.in_(ids.subquery()))
+        return query
 
 
-class LSSync(cli.BaseCommand):
+class LSSync(ListCommandMixin, cli.BaseCommand):
     """List the status of every pawprint-stack and their tile"""
 
-    def setup(self):
-        self.parser.add_argument(
-            "-st", "--status", dest="status", action="store",
-            choices=PawprintStackXTile.statuses.enums, nargs="+",
-            help="Show only the given status")
+    model_name = "PawprintStackXTile"
+    header = ("Tile", "Pawprint", "Matched N.", "Status")
 
-    def handle(self, status):
-        log2critcal()
+    def build_query(self, session, model):
+        from carpyncho.models import Tile, PawprintStack
 
-        table = Texttable(max_width=0)
-        table.set_deco(Texttable.BORDER | Texttable.HEADER | Texttable.VLINES)
-        table.header(("Tile", "Pawprint", "Matched N.", "Status"))
-
-        with db.session_scope() as session:
-            query = session.query(PawprintStackXTile)
-            if status:
-                query = query.filter(PawprintStackXTile.status.in_(status))
-            for pxt in query:
-                table.add_row([pxt.tile.name,
-                               pxt.pawprint_stack.name,
-                               pxt.matched_number,
-                               pxt.status])
-            cnt = query.count()
-        print(table.draw())
-        print("Count: {}".format(cnt))
+        # the names are selected with joins instead of loading the
+        # related objects
+        return session.query(
+            Tile.name, PawprintStack.name, model.matched_number, model.status
+        ).select_from(model).join(model.tile).join(model.pawprint_stack)
 
 
 class SetTileStatus(cli.BaseCommand):
@@ -175,22 +220,34 @@ class SetTileStatus(cli.BaseCommand):
             "tnames", action="store", nargs="+",
             help="Name of the tile to change the status")
         self.parser.add_argument(
-            "--status", action="store", dest="status", choices=Tile.statuses,
-            help="New status")
+            "--status", action="store", dest="status", required=True,
+            choices=StatusChoices("Tile"), metavar="STATUS",
+            help="New status (%(choices)s)")
 
     def handle(self, tnames, status):
+        from carpyncho.models import Tile
+
         log2critcal()
         with db.session_scope() as session:
-            for tile in session.query(Tile).filter(Tile.name.in_(tnames)):
-                tile.status = status
-                print("[SUCCESS] Tile '{}' -> {}".format(tile.name, status))
+            query = session.query(Tile).filter(Tile.name.in_(tnames))
+            found = set(r[0] for r in query.with_entities(Tile.name))
+
+            # the status is required and validated by the parser choices
+            query.update({Tile.status: status}, synchronize_session=False)
+
+        for tname in tnames:
+            if tname in found:
+                print("[SUCCESS] Tile '{}' -> {}".format(tname, status))
+            else:
+                print("[FAIL] Tile '{}' not found".format(tname))
 
 
 class SampleFeatures(cli.BaseCommand):
     """Create a sample of features of the given tile name.
 
     This sample contains all the know variable stars and a subset of unknow
-    sources.
+    sources. Set the CARPYNCHO_SEED environment variable to get a
+    reproducible sample.
 
     """
 
@@ -243,14 +300,16 @@ class SampleFeatures(cli.BaseCommand):
         self.parser.add_argument(
             "--ignore-memory", "-i", dest="memory_check", default=True,
             action="store_false",
-            help="ignore the memory che before run the command")
+            help=("ignore the memory check made before load the features "
+                  "files that can't be memory mapped"))
 
     def cone_search(self, features, ra_c, dec_c, sr_c):
+        """Return a mask of the features inside the given cone"""
         import numpy as np
 
         # sometimes the ra_k cames in str...
-        features.ra_k = features.ra_k.astype(float)
-        features.dec_k = features.dec_k.astype(float)
+        ra_k = features["ra_k"].astype(float)
+        dec_k = features["dec_k"].astype(float)
 
         # the conesearch
         # based on:
@@ -267,27 +326,28 @@ class SampleFeatures(cli.BaseCommand):
         #       SIN(($RA_C - RA)/2))) <= $SR_C
         query = 2. * np.arcsin(
             np.sqrt(
-                np.sin((dec_c - features.dec_k) / 2.) *
-                np.sin((dec_c - features.dec_k) / 2.) +
-                np.cos(dec_c) * np.cos(features.dec_k) *
-                np.sin((ra_c - features.ra_k) / 2.) *
-                np.sin((ra_c - features.ra_k) / 2.))) <= sr_c
+                np.sin((dec_c - dec_k) / 2.) *
+                np.sin((dec_c - dec_k) / 2.) +
+                np.cos(dec_c) * np.cos(dec_k) *
+                np.sin((ra_c - ra_k) / 2.) *
+                np.sin((ra_c - ra_k) / 2.))) <= sr_c
 
-        # filtering
-        features = features[query]
-        return features
+        return query
 
+    def check_memory(self):
+        """Raise a MemoryError if there is less than 32GB of memory"""
+        from psutil import virtual_memory
 
-    def handle(
-        self, tnames, output, cone_search, no_cls_size, no_saturated,
-        no_faint, include_vs, memory_check, vs_type):
         min_memory, mem = int(32e+9), virtual_memory()
-        if memory_check and mem.total < min_memory:
+        if mem.total < min_memory:
             min_memory_gb = min_memory / 1e+9
             total_gb = mem.total / 1e+9
             msg = "You need at least {}GB of memory. Found {}GB"
             raise MemoryError(msg.format(min_memory_gb, total_gb))
 
+    def handle(
+        self, tnames, output, cone_search, no_cls_size, no_saturated,
+        no_faint, include_vs, memory_check, vs_type):
         if no_cls_size == "O2O" and not include_vs:
             self.parser.error(
                 "You can't set the parameter '--ucls-size/-u' to 'O2O' "
@@ -298,58 +358,88 @@ class SampleFeatures(cli.BaseCommand):
                 "You can't set the parameter '--variable-stars-type/-vst' "
                 "if you set the flag '--no-variable-stars/-nvs'")
 
+        import numpy as np
         import pandas as pd
 
+        from carpyncho.models import Tile, LightCurves
+
+        random = get_random_state()
+
         result = []
         with db.session_scope() as session:
             query = session.query(
                 LightCurves).join(Tile).filter(Tile.name.in_(tnames))
             for lc in query:
-                print "Reading features of tile {}...".format(lc.tile.name)
-
-                features = pd.DataFrame(lc.features)
-                print "Sources {}".format(len(features))
+                print("Reading features of tile {}...".format(lc.tile.name))
+
+                # the features are memory mapped: all the filters are
+                # computed over single columns and only the selected rows
+                # are copied into memory
+                try:
+                    features = lc.load_features(mmap_mode="r")
+                except ValueError:
+                    # old features files store the vs_catalog as python
+                    # objects, numpy can't map them so the whole file is
+                    # loaded
+                    if memory_check:
+                        self.check_memory()
+                    features = lc.load_features()
+                print("Sources {}".format(len(features)))
+
+                selected = np.ones(len(features), dtype=bool)
 
                 if no_saturated:
-                    print "No saturated <-"
-                    features = features[features.Mean > 12]
+                    print("No saturated <-")
+                    selected &= features["Mean"] > 12
 
                 if no_faint:
-                    print "No Faint <-"
-                    features = features[features.Mean < 16.5]
+                    print("No Faint <-")
+                    selected &= features["Mean"] < 16.5
 
                 if cone_search:
                     ra, dec, radius = cone_search
-                    print "ConeSearch({}, {}, {}) <-".format(ra, dec, radius)
-                    features = self.cone_search(
+                    print("ConeSearch({}, {}, {}) <-".format(ra, dec, radius))
+                    selected &= self.cone_search(
                         features=features, ra_c=ra, dec_c=dec, sr_c=radius)
 
+                # the vs_type is stored as bytes, so the empty ones are
+                # found by their length (comparing with "" fails on py3)
+                is_vs = np.char.str_len(features["vs_type"]) > 0
+
                 if include_vs:
-                    print "Retrieving '{}' VS <-".format(vs_type or all)
-                    vss = features[features.vs_type != ""]
+                    print("Retrieving '{}' VS <-".format(vs_type or "all"))
+                    vss = pd.DataFrame(
+                        features[np.flatnonzero(selected & is_vs)])
                     if vs_type:
-                        vss = vss[vss.vs_type.str.contains(vs_type)]
+                        vss = vss[vss.vs_type.str.decode(
+                            "utf-8").str.contains(vs_type)]
                     if len(vss):
                         result.append(vss)
 
-                print "Sampling Unk Src <-"
-                unk = features[features.vs_type == ""]
+                print("Sampling Unk Src <-")
+                unk_idx = np.flatnonzero(selected & ~is_vs)
                 if no_cls_size == "ALL":
-                    sample_size = len(unk)
-                elif no_cls_size == "O2O":
-                    sample_size = len(vss)
-                    if sample_size == 0:
-                        continue
+                    picked = unk_idx
                 else:
-                    sample_size = no_cls_size
-                unk = unk.sample(sample_size)
+                    if no_cls_size == "O2O":
+                        sample_size = len(vss)
+                        if sample_size == 0:
+                            continue
+                    else:
+                        sample_size = no_cls_size
+
+                    # sample only the positions of the unknow sources, and
+                    # keep them sorted to read the file forward
+                    picked = unk_idx[np.sort(random.choice(
+                        len(unk_idx), size=sample_size, replace=False))]
+                unk = pd.DataFrame(features[picked])
                 result.append(unk)
 
-        print "Merging"
+        print("Merging")
         result = pd.concat(result, ignore_index=True)
         print("Total Size {}".format(len(result)))
 
-        print "Saving to {}".format(output)
+        print("Saving to {}".format(output))
         ext = os.path.splitext(output)[-1]
         if ext == ".csv":
             result.to_csv(output, index=False)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""Numeric kernels used when the pawprint stacks are read.
+
+If numba is installed the kernels are compiled into a single fused loop,
+otherwise the same computation is made with numpy ufuncs writing into the
+output buffers.
+
+"""
+
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+MINUTES = 1. / 60.
+
+SECONDS = 1. / 3600.
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+
+def _fill_degrees_numpy(
+        ra_h, ra_m, ra_s, dec_d, dec_m, dec_s, ra_out, dec_out):
+    buff = np.empty(len(ra_out))
+
+    np.multiply(ra_m, MINUTES, out=ra_out)
+    np.multiply(ra_s, SECONDS, out=buff)
+    np.add(ra_out, buff, out=ra_out)
+    np.add(ra_out, ra_h, out=ra_out)
+    np.multiply(ra_out, 15., out=ra_out)
+
+    np.multiply(dec_m, MINUTES, out=dec_out)
+    np.multiply(dec_s, SECONDS, out=buff)
+    np.add(dec_out, buff, out=dec_out)
+    np.absolute(dec_d, out=buff)
+    np.add(dec_out, buff, out=dec_out)
+    np.sign(dec_d, out=buff)
+    np.multiply(dec_out, buff, out=dec_out)
+
+
+def _fill_degrees_loop(
+        ra_h, ra_m, ra_s, dec_d, dec_m, dec_s, ra_out, dec_out):
+    for idx in numba.prange(ra_out.size):
+        ra_out[idx] = 15. * (
+            ra_h[idx] + ra_m[idx] * MINUTES + ra_s[idx] * SECONDS)
+
+        # same as numpy.sign
+        deg = dec_d[idx]
+        sign = 1. if deg > 0 else (-1. if deg < 0 else 0.)
+        dec_out[idx] = sign * (
+            abs(deg) + dec_m[idx] * MINUTES + dec_s[idx] * SECONDS)
+
+
+if numba is None:
+    _fill_degrees = _fill_degrees_numpy
+else:
+    _fill_degrees = numba.njit(
+        parallel=True, fastmath=True, cache=True)(_fill_degrees_loop)
+
+
+def fill_degrees(ra_h, ra_m, ra_s, dec_d, dec_m, dec_s, ra_out, dec_out):
+    """Convert the sexagesimal ra and dec to degrees
+
+    The results are written into ``ra_out`` and ``dec_out`` (which can be
+    fields of a structured array) without any other full size temporary
+    array.
+
+    """
+    _fill_degrees(ra_h, ra_m, ra_s, dec_d, dec_m, dec_s, ra_out, dec_out)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""Minimal renderer of text tables for the carpyncho commands.
+
+The output looks like a texttable with BORDER, HEADER and VLINES decoration
+but every cell is converted to string only once and the whole table is
+joined in a single pass.
+
+"""
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+FLOAT_FMT = "{:.3f}"
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+
+def _to_str(value):
+    if isinstance(value, float):
+        return FLOAT_FMT.format(value)
+    return "{}".format(value)
+
+
+def render(header, rows):
+    """Render the header and the rows as a table
+
+    Parameters
+    ----------
+
+    header : iterable
+        The title of every column.
+    rows : iterable of iterables
+        The values of every row. Must have the same size of the header.
+
+    """
+    header = [_to_str(title) for title in header]
+    rows = [[_to_str(value) for value in row] for row in rows]
+
+    widths = [max(map(len, column)) for column in zip(header, *rows)]
+
+    row_fmt = "| {} |".format(
+        " | ".join("{{:<{}}}".format(width) for width in widths))
+    border = "+-{}-+".format("-+-".join("-" * width for width in widths))
+    header_border = border.replace("-", "=")
+
+    lines = [border, row_fmt.format(*header), header_border]
+    lines.extend(row_fmt.format(*row) for row in rows)
+    lines.append(border)
+    return "\n".join(lines)
@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""Numpy port of the vvv_flx2mag fortran program (written by Istvan Dekany
+and located at carpyncho/bin/vvv_flx2mag) which is a modified version of
+the code fitsio_cat_list written by CASU.
+
+Computes the positions, the magnitudes and their errors in the first 7
+apertures of every source of a CASU catalog, reading the FITS binary tables
+directly instead of creating an intermediate ascii table.
+
+The illumination correction table is not supported.
+
+"""
+
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import numpy as np
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+NAPERS = 7
+
+# columns number (1 based) of the CASU catalogs
+X_COL, Y_COL = 3, 5
+ELLIPT_COL, PA_COL = 8, 9
+PEAK_COL = 18
+APER_FLUX_1_COL = 20
+ERRBIT_COL, SKYLOC_COL, CONFIDENCE_COL, CLS_COL = 55, 56, 58, 61
+
+# only detected objects (flux in the third aperture) are returned
+MIN_DETECTION_FLUX = 0.5
+
+SATURATED_CLS = -9
+
+BAD_PIXELS_CLS = -7
+
+
+# =============================================================================
+# HEADERS
+# =============================================================================
+
+def _get_key(header, keys, default=None):
+    for key in keys:
+        if key in header:
+            return header[key]
+    return default
+
+
+def _primary_info(header):
+    """See if VIRCAM or VST and get some info from PHU"""
+    instrument = header.get("INSTRUME", "")
+    esocam = (
+        1 if "VIRCAM" in instrument else
+        2 if "OMEGACAM" in instrument else 0)
+    airmass = header.get("ESO TEL AIRM END", 1.0) if esocam else None
+    exptime = header.get("EXPTIME", 0.0) if esocam else 0.0
+    return esocam, airmass, exptime
+
+
+def _photometry_info(header, esocam, airmass, phu_exptime):
+    exptime = _get_key(header, ("EXPTIME", "EXPOSED", "EXP_TIME"))
+    exptime = 0.0 if exptime is None else max(1.0, abs(exptime))
+    if exptime == 0.0:
+        exptime = phu_exptime
+        if exptime == 0.0:
+            raise ValueError("exposure time information missing")
+
+    saturate = 0.9 * header.get("SATURATE", 30000.0)
+
+    apcorpk = 10.0 ** (0.4 * header.get("APCORPK", 0.0))
+    apcor = np.array([
+        header.get("APCOR{}".format(iap + 1), 0.0) for iap in range(NAPERS)])
+
+    # aperture corrections in flux for ring apertures
+    delapcor = 10.0 ** (0.4 * np.array([
+        apcorpk - apcor[0],  # 'ring' between ap1 and peak flux
+        apcor[0] - apcor[1],  # ring between ap2 and ap1
+        apcor[1] - apcor[2],  # ring between ap3 and ap2
+        apcor[2] - apcor[3],  # ring between ap3 and ap4
+        apcor[2] - apcor[4],  # ring between ap3 and ap5
+        apcor[2] - apcor[5],  # ring between ap3 and ap6
+        apcor[2] - apcor[6]]))  # ring between ap3 and ap7
+
+    # aperture corrections in flux for apertures 1-7
+    apcor = 10.0 ** (0.4 * apcor)
+
+    percorr = 10.0 ** (0.4 * header.get("PERCORR", 0.0))
+
+    if not esocam:
+        if "AIRMASS" in header:
+            airmass = header["AIRMASS"]
+        elif "AMSTART" in header and "AMEND" in header:
+            airmass = 0.5 * (header["AMSTART"] + header["AMEND"])
+        else:
+            airmass = 1.0
+
+    magzpt = header.get("MAGZPT", -1.0)
+    extinct = header.get("EXTINCT", 0.05)
+    magzpt = magzpt - (airmass - 1.0) * extinct + 2.5 * np.log10(exptime)
+
+    return {
+        "saturate": saturate, "apcorpk": apcorpk, "apcor": apcor,
+        "delapcor": delapcor, "percorr": percorr, "magzpt": magzpt}
+
+
+def _wcs_info(header, esocam):
+    ctype = _get_key(header, ("CTYPE1", "TCTYP3"), "")
+    if "RA---" not in ctype:
+        raise ValueError("No WCS present")
+
+    if esocam:
+        ctype = header.get("TCTYP3", "")
+        c, f = header["TCRPX3"], header["TCRPX5"]
+        tpa, tpd = header["TCRVL3"], header["TCRVL5"]
+    else:
+        c, f = header["CRPIX1"], header["CRPIX2"]
+        tpa, tpd = header["CRVAL1"], header["CRVAL2"]
+
+    tpa, tpd = np.radians(tpa), np.radians(tpd)
+
+    a = np.radians(_get_key(header, ("CD1_1", "TC3_3")))
+    e = np.radians(_get_key(header, ("CD2_2", "TC5_5")))
+    b = np.radians(_get_key(header, ("CD1_2", "TC3_5"), 0.0))
+    d = np.radians(_get_key(header, ("CD2_1", "TC5_3"), 0.0))
+
+    # orientation
+    theta = np.degrees(
+        0.5 * (np.arctan(abs(b) / abs(a)) + np.arctan(abs(d) / abs(e))))
+
+    return {
+        "zpn": "RA---TAN" not in ctype,
+        "a": a, "b": b, "c": c, "d": d, "e": e, "f": f,
+        "tpa": tpa, "tand": np.tan(tpd), "secd": 1.0 / np.cos(tpd),
+        "theta": theta, "projp1": 1.0,
+        "projp3": _get_key(header, ("PV2_3", "PROJP3", "TV5_3"), 0.0),
+        "projp5": _get_key(header, ("PV2_5", "TV5_5"), 0.0)}
+
+
+# =============================================================================
+# ASTROMETRY
+# =============================================================================
+
+def _standard_coordinates(x, y, wcs):
+    xi = wcs["a"] * (x - wcs["c"]) + wcs["b"] * (y - wcs["f"])
+    xn = wcs["d"] * (x - wcs["c"]) + wcs["e"] * (y - wcs["f"])
+    return xi, xn, np.sqrt(xi ** 2 + xn ** 2)
+
+
+def _zp_factor(r, wcs):
+    return wcs["projp1"] + wcs["projp3"] * r ** 2 + wcs["projp5"] * r ** 4
+
+
+def radeczp(x, y, wcs):
+    """Converts x,y coordinates to ra and dec (in radians) using ZP wrt
+    optical axis.
+
+    This is an extension of the ARC projection using Zenithal polynomials.
+
+    """
+    xi, xn, r = _standard_coordinates(x, y, wcs)
+    if wcs["zpn"]:
+        # first order approximation and then the second order correction
+        rfac = _zp_factor(r / _zp_factor(r, wcs), wcs)
+    else:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rfac = np.where(r == 0., 1., r / np.tan(r))
+    xi, xn = xi / rfac, xn / rfac
+
+    aa = np.arctan(xi * wcs["secd"] / (1.0 - xn * wcs["tand"]))
+    alpha = np.mod(aa + wcs["tpa"], 2 * np.pi)
+    delta = np.arctan((xn + wcs["tand"]) * np.sin(aa) / (xi * wcs["secd"]))
+    return alpha, delta
+
+
+def distort(x, y, wcs):
+    """Works out flux distortion factor of the x,y coordinates"""
+    xi, xn, r = _standard_coordinates(x, y, wcs)
+    if wcs["zpn"]:
+        projp1, projp3, projp5 = wcs["projp1"], wcs["projp3"], wcs["projp5"]
+        distortcorr = (
+            1.0 + 3.0 * projp3 * r ** 2 / projp1 +
+            5.0 * projp5 * r ** 4 / projp1)
+        distortcorr *= 1.0 + (projp3 * r ** 2 + projp5 * r ** 4) / projp1
+    else:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            distortcorr = np.where(
+                r == 0., 1., np.arctan(r) / r / (1.0 + np.tan(r) ** 2))
+    return 1.0 / distortcorr
+
+
+def _sexagesimal(temp, sec_decimals):
+    units = temp.astype(np.int64)
+    hd = units // 3600
+    minutes = (units - 3600 * hd) // 60
+    sec = temp - hd * 3600 - minutes * 60
+
+    # check for illegal sexagesimals
+    overflow = np.round(sec, sec_decimals) >= 60.
+    sec[overflow] = 0.
+    minutes[overflow] += 1
+
+    overflow = minutes == 60
+    minutes[overflow] = 0
+    hd[overflow] += 1
+    return hd, minutes, sec
+
+
+def rahour(ra):
+    """Converts radians into hours, mins, secs"""
+    ra = np.where(ra < 0., ra + 2 * np.pi, ra)
+    hours, minutes, sec = _sexagesimal(np.degrees(ra) * 240., 2)
+    hours[hours == 24] = 0
+    return hours, minutes, sec
+
+
+def radeg(dec):
+    """Converts radians into degs, mins, secs. Only the degrees have sign"""
+    degs, minutes, secs = _sexagesimal(np.degrees(np.abs(dec)) * 3600., 1)
+    return np.where(dec < 0., -degs, degs), minutes, secs
+
+
+# =============================================================================
+# PHOTOMETRY
+# =============================================================================
+
+def fix_saturation(flux, peak, phot):
+    """Saturation correction (inplace) using ring apertures to avoid flux
+    bias in PSF core:
+
+    - ``F = (f2 - f1) * C``
+    - ``C = c1c2/(c1-c2) = c1 / (c1/c2 - 1) = c1 / (delapcor - 1)``
+
+    where F is the corrected flux of a star, f1, f2 are fluxes in ap1 and ap2
+    (R_ap1 < R_ap2), and ``F = f1*c1 , F = f2*c2`` (by definition)
+
+    """
+    apcor, delapcor = phot["apcor"], phot["delapcor"]
+
+    # AP7, AP6, AP5, AP4: the ring between the aperture and AP3
+    for iap in (6, 5, 4, 3):
+        fixed = (flux[:, iap] - flux[:, 2]) / (delapcor[iap] - 1.0)
+        fixed *= apcor[2]
+        # the original code keep the flux of the AP3 in the AP5
+        flux[:, iap] = np.maximum(fixed, flux[:, 2 if iap == 4 else iap])
+
+    # AP3, AP2: the ring between the aperture and the previous one
+    for iap in (2, 1):
+        fixed = (flux[:, iap] - flux[:, iap - 1]) / (delapcor[iap] - 1.0)
+        fixed *= apcor[iap - 1]
+        flux[:, iap] = np.maximum(fixed, flux[:, iap])
+
+    # AP1: the 'ring' between AP1 and PEAK
+    fixed = (flux[:, 0] - peak) / (delapcor[0] - 1.0)
+    fixed *= phot["apcorpk"]
+    flux[:, 0] = np.maximum(fixed, flux[:, 0])
+
+
+# =============================================================================
+# API
+# =============================================================================
+
+def read_extension(hdu, chip_nro, dtype, esocam, airmass, exptime):
+    """Read a catalog extension and return a numpy record array with the
+    given dtype
+
+    """
+    header = hdu.header
+    phot = _photometry_info(header, esocam, airmass, exptime)
+    wcs = _wcs_info(header, esocam)
+
+    def column(number):
+        return np.asarray(hdu.data.field(number - 1), dtype=np.float64)
+
+    xcord, ycord = column(X_COL), column(Y_COL)
+
+    flux_cols = APER_FLUX_1_COL + 2 * np.arange(NAPERS)
+    flux = np.column_stack([column(col) for col in flux_cols])
+    flux = np.maximum(0.1, flux)
+    fluxerr = np.column_stack([column(col + 1) for col in flux_cols])
+    fluxerr = np.maximum(1.0, fluxerr)
+
+    peak = column(PEAK_COL)
+    tpeak = peak + column(SKYLOC_COL)
+    icls = column(CLS_COL).astype(int)
+
+    # flag possibly saturated objects and correct flux for saturation
+    saturated = tpeak > phot["saturate"]
+    icls[saturated] = SATURATED_CLS
+    sat_flux = flux[saturated]
+    fix_saturation(sat_flux, peak[saturated], phot)
+    flux[saturated] = sat_flux
+
+    # flag objects containing bad pixels
+    icls[column(ERRBIT_COL) > 0.] = BAD_PIXELS_CLS
+
+    # a bit of astrometry
+    alpha, delta = radeczp(xcord, ycord, wcs)
+    ra_h, ra_m, ra_s = rahour(alpha)
+    dec_d, dec_m, dec_s = radeg(delta)
+
+    # apply aperture (saturated ones has them already applied) and
+    # distortion corrections
+    corr = (phot["percorr"] * distort(xcord, ycord, wcs))[:, np.newaxis]
+    flux = np.where(
+        (icls == SATURATED_CLS)[:, np.newaxis],
+        flux * corr, flux * phot["apcor"] * corr)
+    fluxerr = fluxerr * phot["apcor"] * corr
+
+    magobj = phot["magzpt"] - 2.5 * np.log10(flux)
+    magerr = 2.5 * np.log10(1.0 + fluxerr / flux)
+
+    # store the results of the detected objects
+    detected = flux[:, 2] >= MIN_DETECTION_FLUX
+
+    data = np.empty(np.sum(detected), dtype=dtype)
+    columns = [
+        ("ra_h", ra_h), ("ra_m", ra_m), ("ra_s", ra_s),
+        ("dec_d", dec_d), ("dec_m", dec_m), ("dec_s", dec_s),
+        ("x", xcord), ("y", ycord),
+        ("chip_nro", chip_nro), ("stel_cls", icls),
+        ("elip", column(ELLIPT_COL)),
+        ("pos_ang", 90.0 - (column(PA_COL) - wcs["theta"])),
+        ("confidence", column(CONFIDENCE_COL))]
+    for iap in range(NAPERS):
+        columns.extend([
+            ("mag{}".format(iap + 1), magobj[:, iap]),
+            ("mag_err{}".format(iap + 1), magerr[:, iap])])
+
+    for name, values in columns:
+        data[name] = values[detected] if np.ndim(values) else values
+    return data
+
+
+def flx2mag(hdulist, dtype):
+    """Computes the positions and the magnitudes of all the sources in every
+    extension of a CASU catalog.
+
+    Parameters
+    ----------
+
+    hdulist : astropy.io.fits.HDUList
+        The opened catalog.
+    dtype : numpy dtype
+        Must have the fields 'ra_h', 'ra_m', 'ra_s', 'dec_d', 'dec_m',
+        'dec_s', 'x', 'y', 'mag1', 'mag_err1', ... 'mag7', 'mag_err7',
+        'chip_nro', 'stel_cls', 'elip', 'pos_ang' and 'confidence'.
+
+    """
+    esocam, airmass, exptime = _primary_info(hdulist[0].header)
+    nmefs = max(1, len(hdulist) - 1)
+    extensions = [
+        read_extension(
+            hdulist[mef], chip_nro=mef, dtype=dtype, esocam=esocam,
+            airmass=airmass, exptime=exptime)
+        for mef in range(1, nmefs + 1)]
+    return np.concatenate(extensions)
@@ -186,12 +186,17 @@ class LightCurves(db.Model):
         path = os.path.join(self.lc_path, fname)
         np.save(path, arr)
 
-    @property
-    def features(self):
+    def load_features(self, mmap_mode=None):
         fname = "features_{}.npy".format(self.tile.name)
         path = os.path.join(self.lc_path, fname)
         if os.path.exists(path):
-            return np.load(path)
+            # numpy raises a ValueError if the file has python objects and
+            # a mmap_mode is given
+            return np.load(path, mmap_mode=mmap_mode)
+
+    @property
+    def features(self):
+        return self.load_features()
 
     @features.setter
     def features(self, arr):
@@ -17,12 +17,12 @@
 # IMPORTS
 # =============================================================================
 
+from __future__ import print_function
+
+import importlib
 import logging
 import os
 
-import numpy
-import pandas
-
 import colored_traceback.auto  # noqa
 
 
@@ -79,11 +79,27 @@ STEPS = [
 ALERTS = []
 
 
+class LazyShellLocals(object):
+    """Modules that are imported only when the shell reads them.
+
+    This keeps the settings from importing numpy and pandas. Note that the
+    corral commands run, groups and lssteps still import every step (and
+    so numpy, pandas and astropy) when the cli parser is created.
+
+    """
+
+    def __init__(self, **modules):
+        self._modules = modules
+
+    def keys(self):
+        return self._modules.keys()
+
+    def __getitem__(self, name):
+        return importlib.import_module(self._modules[name])
+
+
 # This values are autoimported when you open the shell
-SHELL_LOCALS = {
-    "np": numpy,
-    "pd": pandas
-}
+SHELL_LOCALS = LazyShellLocals(np="numpy", pd="pandas")
 
 
 # SMTP server configuration
@@ -100,7 +116,7 @@ try:
     from carpyncho.local_settings import *  # noqa
     DEBUG_PROCESS = False
 except ImportError:
-    print "local_settings.py not found"
+    print("local_settings.py not found")
     DEBUG_PROCESS = True
     INPUT_PATH = os.path.abspath(os.path.join(PATH, "..", "_input_data"))
     DATA_PATH = os.path.abspath(os.path.join(PATH, "..", "_data"))
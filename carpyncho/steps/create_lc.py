@@ -5,6 +5,8 @@
 # IMPORTS
 # =============================================================================
 
+from __future__ import print_function
+
 import numpy as np
 
 from joblib import Parallel, delayed, cpu_count
@@ -28,6 +30,12 @@ S_COLUMNS = [
     "bm_src_id", "pwp_id", "pwp_stack_src_id", "pwp_stack_src_hjd",
     "pwp_stack_src_mag3", "pwp_stack_src_mag_err3"]
 
+# fixed dtype of the observations, so the matchs of pawprint stacks stored
+# with different precision can be concatenated
+S_DTYPE = {
+    "names": S_COLUMNS,
+    "formats": [np.int64, np.int64, np.int64, float, np.float32, np.float32]}
+
 CPUS = cpu_count()
 
 
@@ -44,7 +52,7 @@ def read_pxt(pxt_path, pwp_id, total, idx, tile_name):
 
     extra_cols = [("pwp_id", ids, )]
 
-    arr = beamc.add_columns(arr, extra_cols)[S_COLUMNS]
+    arr = beamc.add_columns(arr, extra_cols)[S_COLUMNS].astype(S_DTYPE)
 
     return arr
 
@@ -82,7 +90,7 @@ class CreateLightCurves(run.Step):
 
     def process(self, tile_pxts):
         tile, pxts = tile_pxts
-        print tile, "<<" * 40
+        print(tile, "<<" * 40)
 
         # new light curve
         lc = LightCurves(tile=tile)
@@ -201,6 +201,9 @@ class FeaturesExtractor(run.Step):
 
         # change dtype by making a whole new array
         descr = sources.dtype.descr
+        # the vs_catalog is stored with a fixed size (like in the tile) so
+        # the features file can be memory mapped by numpy
+        descr[1] = (descr[1][0], '|S13')
         descr[2] = (descr[2][0], '|S13')
         descr[3] = (descr[3][0], '|S13')
         descr = [(str(n), t) for n, t in descr]
@@ -40,7 +40,9 @@ def match(
     pxt_id, tile_name, tile_id,
     pawprint_stack_id, band, tile_data, pwp_path
 ):
-    pwp_data = np.load(pwp_path)
+    # only the coordinates and the matched sources are read from disk. The
+    # workers receive the path (not the model) so nothing big is pickled
+    pwp_data = np.load(pwp_path, mmap_mode="r")
 
     # create dtype
     dtype = {
@@ -4,11 +4,6 @@
 # IMPORTS
 # =============================================================================
 
-import shutil
-import tempfile
-import os
-import copy
-
 import numpy as np
 
 from corral import run
@@ -19,8 +14,8 @@ from PyAstronomy import pyasl
 
 from six.moves import zip, range
 
-from .. import bin
-from ..lib.context_managers import cd
+from ..lib.fastmath import fill_degrees
+from ..lib.flx2mag import flx2mag
 from ..models import PawprintStack
 
 
@@ -37,14 +32,22 @@ PAWPRINT_DTYPE = {
         'chip_nro', 'stel_cls', 'elip', 'pos_ang', 'confidence',
     ],
     "formats": [
-        int, int, float, int, int, float, float, float,
-        float, float, float, float,
-        float, float, float, float,
-        float, float, float, float, float, float,
-        int, int, float, float, float
+        np.int8, np.int8, np.float32, np.int8, np.int8, np.float32,
+        np.float32, np.float32,
+        np.float32, np.float32, np.float32, np.float32,
+        np.float32, np.float32, np.float32, np.float32,
+        np.float32, np.float32, np.float32, np.float32,
+        np.float32, np.float32,
+        np.int8, np.int8, np.float32, np.float32, np.float32
     ]
 }
 
+# dtype of the stored array: the original columns with the id, the hjd
+# and the ra and dec as degrees at the beginning
+NPY_PAWPRINT_DTYPE = np.dtype({
+    "names": ["id", "hjd", "ra_deg", "dec_deg"] + PAWPRINT_DTYPE["names"],
+    "formats": [np.int64, float, float, float] + PAWPRINT_DTYPE["formats"]})
+
 
 # =============================================================================
 # STEPS
@@ -61,18 +64,6 @@ class ReadPawprintStack(run.Step):
     conditions = [model.status == "raw"]
     groups = ["preprocess", "read"]
 
-    # =========================================================================
-    # STEP SETUP & TEARDOWN
-    # =========================================================================
-
-    def setup(self):
-        self.vvv_flx2mag = bin.vvv_flx2mag.execute
-        self.temp_directory = tempfile.mkdtemp(suffix="_carpyncho_ppstk")
-
-    def teardown(self, *args, **kwargs):
-        if not os.path.exists(self.temp_directory):
-            shutil.rmtree(self.temp_directory)
-
     # =========================================================================
     # EXTRACT HEADER
     # =========================================================================
@@ -87,39 +78,16 @@ class ReadPawprintStack(run.Step):
     # =========================================================================
 
     def load_fit(self, pawprint):
-        to_cd = os.path.dirname(pawprint)
-        basename = os.path.basename(pawprint)
-        asciiname = os.path.splitext(basename)[0] + ".txt"
-        asciipath = os.path.join(self.temp_directory, asciiname)
-
-        # create the ascii table
-        with cd(to_cd):
-            self.vvv_flx2mag(basename, asciipath)
-
-        # read ascii table
-        odata = np.genfromtxt(asciipath, PAWPRINT_DTYPE)
-        os.remove(asciipath)
+        # compute the magnitudes directly from the fits binary tables
+        with fits.open(pawprint) as hdulist:
+            odata = flx2mag(hdulist, PAWPRINT_DTYPE)
         return odata, len(odata)
 
-    def add_columns(self, odata, size, pwp_id, mjd, dtypes):
+    def add_columns(self, odata, size, pwp_id, mjd):
         """Add id, hjds, ra_deg and dec_deg columns to existing recarray
 
         """
 
-        # calculate the ra and the dec columns
-        radeg = 15 * (odata['ra_h'] +
-                      odata['ra_m'] / 60.0 +
-                      odata['ra_s'] / 3600.0)
-
-        decdeg = np.sign(odata['dec_d']) * (np.abs(odata['dec_d']) +
-                                            odata['dec_m'] / 60.0 +
-                                            odata['dec_s'] / 3600.0)
-
-        # calculate the hjds
-        hjds = np.fromiter(
-            (pyasl.helio_jd(mjd, ra, dec) for ra, dec in zip(radeg, decdeg)),
-            dtype=float)
-
         # create ids
         ps_name = "3" + str(pwp_id).zfill(7)
 
@@ -130,38 +98,41 @@ class ReadPawprintStack(run.Step):
         ids = np.fromiter(
             (get_id(idx + 1) for idx in range(size)), dtype=np.int64)
 
-        # create a new dtype to store the ra and dec as degrees
-        dtype = copy.deepcopy(dtypes)
-        dtype["names"].insert(0, "dec_deg")
-        dtype["names"].insert(0, "ra_deg")
-        dtype["names"].insert(0, "hjd")
-        dtype["names"].insert(0, "id")
-
-        dtype["formats"].insert(0, float)
-        dtype["formats"].insert(0, float)
-        dtype["formats"].insert(0, float)
-        dtype["formats"].insert(0, np.int64)
-
-        # create an empty array and copy the values
-        data = np.empty(len(odata), dtype=dtype)
-        for name in data.dtype.names:
-            if name == "id":
-                data[name] = ids
-            elif name == "ra_deg":
-                data[name] = radeg
-            elif name == "dec_deg":
-                data[name] = decdeg
-            elif name == "hjd":
-                data[name] = hjds
-            else:
-                data[name] = odata[name]
+        # create an empty array
+        data = np.empty(len(odata), dtype=NPY_PAWPRINT_DTYPE)
+
+        # copy all the original columns in a single pass, through a view
+        # of data that only expose the fields of odata
+        fields = data.dtype.fields
+        odata_view = data.view({
+            "names": odata.dtype.names,
+            "formats": [fields[name][0] for name in odata.dtype.names],
+            "offsets": [fields[name][1] for name in odata.dtype.names],
+            "itemsize": data.dtype.itemsize})
+        odata_view[:] = odata
+
+        # calculate the ra and the dec columns directly inside the array
+        radeg, decdeg = data["ra_deg"], data["dec_deg"]
+        fill_degrees(
+            odata["ra_h"], odata["ra_m"], odata["ra_s"],
+            odata["dec_d"], odata["dec_m"], odata["dec_s"],
+            ra_out=radeg, dec_out=decdeg)
+
+        # calculate the hjds
+        hjds = np.fromiter(
+            (pyasl.helio_jd(mjd, ra, dec) for ra, dec in zip(radeg, decdeg)),
+            dtype=float)
+
+        # and now the new columns
+        data["id"] = ids
+        data["hjd"] = hjds
         return data
 
     def to_array(self, pwp_stk):
         original_array, size = self.load_fit(pwp_stk.raw_file_path)
         arr = self.add_columns(
             odata=original_array, size=size, pwp_id=pwp_stk.id,
-            mjd=pwp_stk.mjd, dtypes=PAWPRINT_DTYPE)
+            mjd=pwp_stk.mjd)
         return arr, size
 
     # =========================================================================
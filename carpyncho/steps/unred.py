@@ -5,6 +5,8 @@
 # IMPORTS
 # =============================================================================
 
+from __future__ import print_function
+
 import time
 import random
 import threading as th
@@ -59,9 +61,9 @@ class ExtintionFetcher(th.Thread):
 
 def filter(sources):
     data = sources
-    print data.shape
+    print(data.shape)
     flt = data[data['ra_k'] != -9999]
-    print flt.shape
+    print(flt.shape)
     return flt
 
 
@@ -20,11 +20,13 @@
 import tempfile
 import os
 import shutil
-import sh
+import tarfile
+
+import mock
 
 import numpy as np
 
-from corral import qa, conf
+from corral import qa, conf, cli
 
 from . import models
 
@@ -32,7 +34,7 @@ from .load import Loader
 from .steps.read_tile import ReadTile
 from .steps.tag_tile import VSTagTile
 from .steps.unred import Unred
-from .steps.read_pawprint_stack import ReadPawprintStack
+from .steps.read_pawprint_stack import ReadPawprintStack, PAWPRINT_DTYPE
 from .steps.prepare_for_match import PrepareForMatch
 from .steps.match import Match
 from .steps.create_lc import CreateLightCurves
@@ -42,6 +44,7 @@ from .commands import (
     Paths, BuildBin, LSTile, LSPawprint, LSSync, SetTileStatus, SampleFeatures)
 
 from .lib.beamc import add_columns
+from .lib import fastmath, fasttable
 
 
 # =============================================================================
@@ -57,6 +60,12 @@ class CarpynchoTestMixin(object):
     EXAMPLE_DATA_PATH = os.path.join(
         conf.settings.BASE_PATH, "example_data")
 
+    # ascii output of the original fortran vvv_flx2mag over the example
+    # pawprint v20100418_00895_st_cat.fits
+    FLX2MAG_REFERENCE_PATH = os.path.join(
+        conf.settings.BASE_PATH, "res",
+        "v20100418_00895_st_cat.vvv_flx2mag.txt.bz2")
+
     def run_another_tests(self, cases):
         runned = []
         for Case in cases:
@@ -73,10 +82,8 @@ class CarpynchoTestMixin(object):
 
         if not os.path.exists(self.EXAMPLE_DATA_PATH):
             os.makedirs(self.EXAMPLE_DATA_PATH)
-            sh.tar(
-                j=True, x=True,
-                f=self.TAR_DATA_PATH,
-                directory=self.EXAMPLE_DATA_PATH)
+            with tarfile.open(self.TAR_DATA_PATH, "r:bz2") as tfp:
+                tfp.extractall(self.EXAMPLE_DATA_PATH)
 
         shutil.copytree(self.EXAMPLE_DATA_PATH, self.work_dir)
         self.input_path = os.path.join(self.work_dir, "example_data")
@@ -143,6 +150,57 @@ class ReadPawprintStackTestCase(CarpynchoTestMixin, qa.TestCase):
             self.assertIn(name, arr.dtype.names)
         self.assertEquals(pwp.status, "ready-to-match")
 
+        # the magnitudes must be the same of the fortran vvv_flx2mag
+        # except for the rounding of its ascii output
+        reference = np.genfromtxt(
+            self.FLX2MAG_REFERENCE_PATH, PAWPRINT_DTYPE)
+        self.assertEquals(len(arr), 103708)
+        self.assertEquals(len(arr), len(reference))
+
+        tolerances = {"ra_s": 2e-4, "dec_s": 1e-3}
+        tolerances.update(
+            (name, 1e-3) for name in names if name.startswith("mag"))
+        for name in ("ra_h", "ra_m", "dec_d", "dec_m", "stel_cls"):
+            np.testing.assert_array_equal(arr[name], reference[name])
+        for name, atol in tolerances.items():
+            np.testing.assert_allclose(
+                arr[name], reference[name], rtol=0, atol=atol)
+
+
+class FillDegreesTestCase(qa.TestCase):
+
+    subject = ReadPawprintStack
+
+    def sexagesimal(self):
+        ra_h = np.array([17., 18., 0., 23.])
+        ra_m = np.array([48., 2., 0., 59.])
+        ra_s = np.array([12.345, 59.999, 0., 1.5])
+        dec_d = np.array([-29., -37., 0., 5.])
+        dec_m = np.array([30., 0., 15., 59.])
+        dec_s = np.array([1.25, 59.5, 30., 0.])
+        return ra_h, ra_m, ra_s, dec_d, dec_m, dec_s
+
+    def fill(self, func):
+        ra_out, dec_out = np.empty(4), np.empty(4)
+        func(*self.sexagesimal(), ra_out=ra_out, dec_out=dec_out)
+        return ra_out, dec_out
+
+    def validate(self):
+        ra_h, ra_m, ra_s, dec_d, dec_m, dec_s = self.sexagesimal()
+        expected_ra = 15 * (ra_h + ra_m / 60.0 + ra_s / 3600.0)
+        expected_dec = np.sign(dec_d) * (
+            np.abs(dec_d) + dec_m / 60.0 + dec_s / 3600.0)
+
+        ra, dec = self.fill(fastmath._fill_degrees_numpy)
+        np.testing.assert_allclose(ra, expected_ra)
+        np.testing.assert_allclose(dec, expected_dec)
+
+        # the numba loop (if installed) must give the same results
+        if fastmath.numba is not None:
+            numba_ra, numba_dec = self.fill(fastmath._fill_degrees)
+            np.testing.assert_allclose(numba_ra, ra)
+            np.testing.assert_allclose(numba_dec, dec)
+
 
 class ReadTileTestCase(CarpynchoTestMixin, qa.TestCase):
 
@@ -412,12 +470,40 @@ class BuildBinCase(CarpynchoTestMixin, qa.TestCase):
         self.assertEquals(self.command_status.exit_status, 0)
 
 
+class RenderTableTestCase(qa.TestCase):
+
+    subject = LSTile
+
+    def validate(self):
+        header = ("Tile", "Size", "Ready")
+        rows = [("b202", 1.5, True), ("b1", 10, None)]
+        expected = "\n".join([
+            "+------+-------+-------+",
+            "| Tile | Size  | Ready |",
+            "+======+=======+=======+",
+            "| b202 | 1.500 | True  |",
+            "| b1   | 10    | None  |",
+            "+------+-------+-------+"])
+        self.assertEquals(fasttable.render(header, rows), expected)
+
+        # without rows only the header is rendered
+        expected = "\n".join([
+            "+------+------+-------+",
+            "| Tile | Size | Ready |",
+            "+======+======+=======+",
+            "+------+------+-------+"])
+        self.assertEquals(fasttable.render(header, []), expected)
+
+
 class LSTileTestCase(CarpynchoTestMixin, qa.TestCase):
 
     run_before = [LoaderTestCase]
     subject = LSTile
 
     def validate(self):
+        out = self.command_status.out
+        self.assertIn("b202", out)
+        self.assertIn("Count: 1", out)
         self.assertEquals(self.command_status.exit_status, 0)
 
 
@@ -427,6 +513,11 @@ class LSPawprintTestCase(CarpynchoTestMixin, qa.TestCase):
     subject = LSPawprint
 
     def validate(self):
+        pwp = self.session.query(models.PawprintStack).one()
+
+        out = self.command_status.out
+        self.assertIn(pwp.name, out)
+        self.assertIn("Count: 1", out)
         self.assertEquals(self.command_status.exit_status, 0)
 
 
@@ -436,6 +527,15 @@ class LSSyncTestCase(CarpynchoTestMixin, qa.TestCase):
     subject = LSSync
 
     def validate(self):
+        pxt = self.session.query(models.PawprintStackXTile).one()
+
+        # the tile and the pawprint must be in the same row
+        rows = [
+            line for line in self.command_status.out.splitlines()
+            if pxt.tile.name in line and pxt.pawprint_stack.name in line]
+        self.assertEquals(len(rows), 1)
+        self.assertIn(pxt.status, rows[0])
+        self.assertIn("Count: 1", self.command_status.out)
         self.assertEquals(self.command_status.exit_status, 0)
 
 
@@ -455,6 +555,40 @@ class SetTileStatusTestCase(CarpynchoTestMixin, qa.TestCase):
         self.assertEquals(self.command_status.exit_status, 0)
 
 
+class SetTileStatusNotFoundTestCase(CarpynchoTestMixin, qa.TestCase):
+
+    run_before = [LoaderTestCase]
+    subject = SetTileStatus
+
+    def setup(self):
+        super(SetTileStatusNotFoundTestCase, self).setup()
+        self.cliargs.extend(["b202", "b999", "--status", "locked"])
+
+    def validate(self):
+        tile = self.session.query(models.Tile).one()
+        self.assertEquals(tile.status, "locked")
+
+        out = self.command_status.out
+        self.assertIn("[SUCCESS] Tile 'b202' -> locked", out)
+        self.assertIn("[FAIL] Tile 'b999' not found", out)
+        self.assertEquals(self.command_status.exit_status, 0)
+
+
+class SetTileStatusRequiredTestCase(CarpynchoTestMixin, qa.TestCase):
+
+    run_before = [LoaderTestCase]
+    subject = SetTileStatus
+
+    def setup(self):
+        super(SetTileStatusRequiredTestCase, self).setup()
+        self.cliargs.extend(["b202", "--status", "locked"])
+
+    def validate(self):
+        parser = cli.create_parser()
+        with self.assertRaises(cli.CorralArgumentParserError):
+            parser.parse_args(["set-tile-status", "b202"])
+
+
 class SampleFeaturesTestCase(CarpynchoTestMixin, qa.TestCase):
 
     run_before = [LoaderTestCase]
@@ -467,7 +601,8 @@ class SampleFeaturesTestCase(CarpynchoTestMixin, qa.TestCase):
         arr_path = os.path.join(self.test_cache, "features.npy")
         arr = np.load(arr_path)
         self.patch(
-            "carpyncho.models.tile.LightCurves.features", arr)
+            "carpyncho.models.tile.LightCurves.load_features",
+            return_value=arr)
 
         tile = self.session.query(models.Tile).one()
 
@@ -483,3 +618,105 @@ class SampleFeaturesTestCase(CarpynchoTestMixin, qa.TestCase):
 
         import pandas as pd  # noqa
         pd.DataFrame.to_pickle.assert_called_once_with("salida.pkl")
+
+
+class SampleFeaturesFromFileTestCase(CarpynchoTestMixin, qa.TestCase):
+
+    run_before = [LoaderTestCase]
+    subject = SampleFeatures
+
+    vs_catalog_dtype = "|S13"
+
+    def setup(self):
+        super(SampleFeaturesFromFileTestCase, self).setup()
+        self.cliargs.extend(["b202", "-o", "salida.pkl", "-u", "10"])
+
+        # same layout of the FeaturesExtractor output
+        size = 30
+        self.arr = np.empty(size, dtype=[
+            ("id", np.int64), ("vs_catalog", self.vs_catalog_dtype),
+            ("vs_type", "|S13"), ("ra_k", "|S13"), ("dec_k", float),
+            ("Mean", float)])
+        self.arr["id"] = np.arange(size)
+        self.arr["vs_catalog"] = ""
+        self.arr["vs_type"] = ""
+        self.arr["vs_catalog"][:5] = "OGLE-3"
+        self.arr["vs_type"][:3] = "RRLyr-RRab"
+        self.arr["vs_type"][3:5] = "Cep-F"
+        self.arr["ra_k"] = "270.5"
+        self.arr["dec_k"] = -30.
+        self.arr["Mean"] = 14.
+
+        tile = self.session.query(models.Tile).one()
+
+        lc = models.LightCurves(tile=tile)
+        lc.features = self.arr
+
+        self.save(lc)
+        self.save(tile)
+
+        # the memory is only checked if the file can't be memory mapped
+        self.patch(
+            "psutil.virtual_memory", return_value=mock.Mock(total=int(1e9)))
+        self.patch("pandas.DataFrame.to_pickle")
+
+    def validate(self):
+        self.assertEquals(self.command_status.exit_status, 0)
+
+        import pandas as pd  # noqa
+        pd.DataFrame.to_pickle.assert_called_once_with("salida.pkl")
+
+        # the 5 variable stars and 10 of the 25 unknown sources
+        self.assertIn("Total Size 15", self.command_status.out)
+
+        lc = self.session.query(models.LightCurves).one()
+        features = lc.load_features(mmap_mode="r")
+        self.assertIsInstance(features, np.memmap)
+        self.assertEquals(features.dtype, self.arr.dtype)
+        for name in self.arr.dtype.names:
+            np.testing.assert_array_equal(features[name], self.arr[name])
+
+
+class SampleFeaturesVSTypeTestCase(SampleFeaturesFromFileTestCase):
+
+    def setup(self):
+        super(SampleFeaturesVSTypeTestCase, self).setup()
+        self.cliargs.extend(["-vst", "RRab"])
+
+    def validate(self):
+        self.assertEquals(self.command_status.exit_status, 0)
+
+        # only the 3 RRab variable stars and 10 unknown sources
+        self.assertIn("Total Size 13", self.command_status.out)
+
+
+class SampleFeaturesObjectColumnTestCase(SampleFeaturesFromFileTestCase):
+
+    # the old features files store the vs_catalog as a python object
+    vs_catalog_dtype = object
+
+    def setup(self):
+        super(SampleFeaturesObjectColumnTestCase, self).setup()
+        self.cliargs.append("-i")
+
+    def validate(self):
+        self.assertEquals(self.command_status.exit_status, 0)
+
+        import pandas as pd  # noqa
+        pd.DataFrame.to_pickle.assert_called_once_with("salida.pkl")
+
+        lc = self.session.query(models.LightCurves).one()
+        with self.assertRaises(ValueError):
+            lc.load_features(mmap_mode="r")
+
+        features = lc.features
+        self.assertEquals(features.dtype, self.arr.dtype)
+        for name in self.arr.dtype.names:
+            np.testing.assert_array_equal(features[name], self.arr[name])
+
+        # without -i the whole file is not loaded with less than 32GB
+        parser = cli.create_parser()
+        command, mode, kwargs, gkwargs = parser.parse_args(
+            ["sample", "b202", "-o", "salida.pkl", "-u", "10"])
+        with self.assertRaises(MemoryError):
+            command.handle(**kwargs)
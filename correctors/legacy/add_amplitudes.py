@@ -24,10 +24,10 @@ def main():
     with db.session_scope() as ses:
         query = ses.query(LightCurves).join(Tile).filter(Tile.name.in_(tiles))
         for lc in query:
-            print lc
+            print(lc)
             feats = lc.features
             if "AmplitudeJH" in feats.dtype.names:
-                print "   skip!"
+                print("   skip!")
                 continue
 
             columns = [
@@ -42,7 +42,7 @@ def main():
             lc.tile.ready = True
 
             ses.commit()
-            print "   Done"
+            print("   Done")
 
 
 
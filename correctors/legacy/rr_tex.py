@@ -37,6 +37,6 @@ def main():
         resume["name"] = "Promedio"
         df = df.append(resume, ignore_index=True)
         df.columns = ["Nombre", u"Tamaño", "RR-Lyrae"]
-        print df.to_latex(index=False)
+        print(df.to_latex(index=False))
 
 main()
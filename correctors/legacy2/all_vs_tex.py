@@ -30,6 +30,6 @@ def main():
         resume["name"] = "Total"
         df = df.append(resume, ignore_index=True)
         df.columns = ["Nombre", u"Tamaño", "Variables"]
-        print df.to_latex(index=False)
+        print(df.to_latex(index=False))
 
 main()
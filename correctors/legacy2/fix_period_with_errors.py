@@ -103,7 +103,7 @@ def main():
         for tile in query:
 
             if tile.name in cache:
-                print "Skiping {}".format(lc.tile.name)
+                print("Skiping {}".format(lc.tile.name))
                 continue
 
             lc = tile.lcurves
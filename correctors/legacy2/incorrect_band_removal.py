@@ -14,7 +14,7 @@ import sys
 sys.path.insert(0, PATH)
 
 def remove(path):
-    print "Removing: " + path
+    print("Removing: " + path)
     if os.path.exists(path):
         os.remove(path)
 
@@ -32,12 +32,12 @@ def main():
         query = ses.query(LightCurves)
         rows = []
         for lc in query.all():
-            print lc
+            print(lc)
             tile = lc.tile
 
             feats = pd.DataFrame(lc.features)
             if "vs_type" in feats.columns:
-                print "skiping"
+                print("skiping")
                 continue
 
             srcs = pd.DataFrame(tile.load_npy_file()[["id", "vs_type", "ra_k", "dec_k"]])
@@ -24,7 +24,7 @@ def main():
         query = ses.query(LightCurves).join(Tile).filter(Tile.name.in_(tiles))
         samples = defaultdict(list)
         for lc in query:
-            print lc
+            print(lc)
             tile = lc.tile
 
             features = pd.DataFrame(lc.features)
@@ -48,6 +48,6 @@ def main():
         df = df.append(p_resume, ignore_index=True)
 
         df.columns = ["Nombre", u"Tamaño", "Util", "RR-Lyrae"]
-        print df.to_latex(index=False, float_format="%.3f")
+        print(df.to_latex(index=False, float_format="%.3f"))
 
 main()
@@ -16,7 +16,7 @@ def main():
     with db.session_scope() as ses:
         query = ses.query(LightCurves).join(Tile)
         for lc in query:
-            print lc
+            print(lc)
 
             features = pd.DataFrame(lc.features)
             features = features[features.Mean > 12]
@@ -24,10 +24,10 @@ def main():
             sample = features.sample(1000)
             result.append(sample)
 
-        print "Merging"
+        print("Merging")
         result = pd.concat(result, ignore_index=True)
 
-        print "Saving to {}".format("sample_all.pkl")
+        print("Saving to {}".format("sample_all.pkl"))
         result.to_pickle("sample_all.pkl.bz2", compression="bz2")
 
 
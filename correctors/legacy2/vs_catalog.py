@@ -47,20 +47,18 @@ fs = feets.FeatureSpace(
         "Freq3_harmonics_rel_phase_0", "Freq3_harmonics_rel_phase_1",
         "Freq3_harmonics_rel_phase_2", "Freq3_harmonics_rel_phase_3"])
 
-import ipdb; ipdb.set_trace()
-
 
 def main():
     with db.session_scope() as ses:
         query = ses.query(LightCurves).filter(LightCurves.tile.has(name="b278"))
         rows = []
         for lc in query.all():
-            print lc
+            print(lc)
             tile = lc.tile
 
             feats = pd.DataFrame(lc.features)
             if "vs_catalog" in feats.columns:
-                print "skiping"
+                print("skiping")
                 continue
 
             srcs = pd.DataFrame(tile.load_npy_file()[["id", "vs_catalog"]])